@@ -6,13 +6,22 @@ import deepl
 import tempfile
 import shutil
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
 import sys
+import json
+import functools
+import hashlib
+import math
+import time
 import difflib
 import re
 import html
 import pikepdf
-from typing import Optional
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
 import struct
 import xml.etree.ElementTree as ET
 try:
@@ -24,6 +33,63 @@ try:
         load_dotenv(local_env, override=True)
 except ImportError:
     pass
+try:
+    # Opcional: rapidfuzz (C++) é bem mais rápido que difflib para o matching fuzzy de nomes de fontes
+    from rapidfuzz import process as rf_process, fuzz as rf_fuzz
+except ImportError:
+    rf_process = None
+try:
+    # Opcional: orjson (C/Rust) decodifica o catálogo do Google Fonts (vários MB) bem mais rápido que o json
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
+# Expressões regulares usadas na normalização de nomes de fontes, compiladas uma única vez
+_RE_PSMT = re.compile(r'psmt$', re.IGNORECASE)
+_RE_PS_BOLDMT = re.compile(r'PS-BoldMT$', re.IGNORECASE)
+_RE_CAMEL = re.compile(r'(?<=[a-z])(?=[A-Z])')
+_RE_NON_ALPHA = re.compile(r'[^A-Za-z]')
+_RE_NON_LOWER = re.compile(r'[^a-z]')
+# Palavras de estilo em nomes de fontes: uma única varredura classifica negrito/itálico
+_RE_STYLE_WORD = re.compile(r'Bold|Italic|Oblique')
+_RE_STYLE_SUFFIX = re.compile(r'[- ]?(Bold|Italic|Regular|Oblique).*$', re.IGNORECASE)
+_RE_CLEAN_REGULAR = re.compile(r'(?i)(?:[- ]?Regular)$')
+_RE_STYLE_TO_REGULAR = re.compile(r'(Bold|Italic|BoldItalic)$')
+_RE_BASE_NAME = re.compile(r'[- ]?(Regular|Bold|Italic|Oblique|BoldItalic)$', re.IGNORECASE)
+# Detecção de texto traduzível (alguma palavra de 2+ letras fora das tags XML de estilo)
+_RE_XML_TAG = re.compile(r'<[^>]+>')
+_RE_PALAVRA = re.compile(r'[^\W\d_]{2,}')
+
+# Operadores de objeto de texto, criados uma vez (comparados a cada instrução do content stream)
+_OP_BT = pikepdf.Operator("BT")
+_OP_ET = pikepdf.Operator("ET")
+
+# Limites por requisição ao DeepL (máx. 50 textos e ~128 KiB de corpo)
+BATCH_SIZE = 50
+BATCH_MAX_BYTES = 120 * 1024
+# Diretório de cache do usuário, reaproveitado entre execuções
+CACHE_DIR = os.path.join(os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'translate_pdf')
+# Memória de tradução: sha1(idioma + texto marcado) -> tradução; cabeçalhos, rodapés e rótulos
+# repetidos são enviados ao DeepL uma única vez, e a memória é persistida em disco entre execuções
+_TRADUCOES_CACHE = {}
+TRADUCOES_CACHE_PATH = os.path.join(CACHE_DIR, 'traducoes.json')
+# Limite de entradas persistidas (as usadas mais recentemente ficam), para o arquivo não crescer sem fim
+TRADUCOES_CACHE_MAX = 20000
+# Chaves consultadas ou traduzidas nesta execução (vão para o fim da ordem de recência ao salvar)
+_TRADUCOES_USADAS = set()
+# Fontes baixadas (Roboto Condensed e variantes do Google Fonts) ficam aqui e não são baixadas de novo
+FONTS_CACHE_DIR = os.path.join(CACHE_DIR, 'fonts')
+
+# Sessão HTTP compartilhada para o catálogo e os downloads de fontes (keep-alive: um único handshake TLS por host)
+# Erros transitórios (limite de taxa, 5xx) são repetidos com backoff antes de cair no fallback
+_HTTP_SESSION = requests.Session()
+_HTTP_ADAPTER = HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+)
+_HTTP_SESSION.mount('https://', _HTTP_ADAPTER)
+_HTTP_SESSION.mount('http://', _HTTP_ADAPTER)
 
 # Configuração do logging
 def setup_logging():
@@ -31,7 +97,8 @@ def setup_logging():
     logger.setLevel(logging.DEBUG)
     
     # Handler para arquivo
-    fh = logging.FileHandler('translate_pdf.log')
+    # delay=True: o arquivo só é aberto quando o primeiro registro é emitido
+    fh = logging.FileHandler('translate_pdf.log', delay=True)
     fh.setLevel(logging.DEBUG)
     
     # Handler para console
@@ -66,9 +133,21 @@ def main():
     if not auth_key:
         raise RuntimeError('DEEPL_API_KEY não está definida')
     translator = deepl.Translator(auth_key)
+    carregar_cache_traducoes(TRADUCOES_CACHE_PATH)
+    traducoes_iniciais = len(_TRADUCOES_CACHE)
 
-    # Diretório temporário para baixar fontes
+    # Diretório temporário para o PDF sem texto e as fontes extraídas do próprio documento;
+    # as fontes baixadas vão para o cache persistente
     tmp_dir = tempfile.mkdtemp(prefix="fonts_")
+    # Sem cache gravável (home somente leitura, hosts sandboxed), as fontes baixadas ficam no diretório temporário
+    fonts_dir = FONTS_CACHE_DIR
+    try:
+        os.makedirs(fonts_dir, exist_ok=True)
+        arquivos_fonte = {os.path.join(fonts_dir, fname) for fname in os.listdir(fonts_dir)}
+    except OSError as e:
+        logger.warning(f"Cache de fontes '{fonts_dir}' indisponível ({e}); usando o diretório temporário '{tmp_dir}'")
+        fonts_dir = tmp_dir
+        arquivos_fonte = set()
     font_registry = {}
     # Mapear nomes de fontes customizadas para seus arquivos
     file_registry = {}
@@ -84,6 +163,9 @@ def main():
                 logger.info(f"Fonte local disponível: '{reg_name}' em '{path}'")
     else:
         local_fonts_map = {}
+    local_keys = list(local_fonts_map.keys())
+    # Índice exato por nome normalizado (só letras, minúsculas): consultado antes de qualquer busca fuzzy
+    local_norm_index = {_RE_NON_LOWER.sub('', k.lower()): k for k in local_keys}
 
     # Gera PDF intermediário sem texto
     pdf_sem_texto = os.path.join(tmp_dir, "no_text.pdf")
@@ -94,11 +176,12 @@ def main():
 
     # Extrai e registra fontes do documento
     font_info_map = {}
-    for page_font in doc:
-        for font in page_font.get_fonts(full=True):
+    for pno in range(len(doc)):
+        for font in doc.get_page_fonts(pno, full=True):
             xref = font[0]
             ps_name = font[3]
-            is_embedded = font[4] if len(font) > 4 else False
+            # font[1] é a extensão do arquivo embutido; 'n/a' indica fonte não embutida (ex.: as 14 padrão)
+            is_embedded = font[1] != 'n/a'
             if ps_name not in font_info_map:
                 font_info_map[ps_name] = (xref, is_embedded)
     # Loga todas as fontes encontradas no PDF original
@@ -107,8 +190,31 @@ def main():
         logger.info(f"Fonte: '{ps_name}' | xref: {xref} | embutida: {is_embedded}")
     logger.info("=== FIM DA LISTA DE FONTES ORIGINAIS ===")
 
+    # Carrega catálogo do Google Fonts (uma vez por execução; cache em disco com validade de 24h)
+    # Índices montados numa única passada pelo catálogo: família -> arquivos, nome minúsculo -> família
+    # (matching case-insensitive), lista de chaves para o fuzzy e nome só com letras -> família
+    google_fonts = {}
+    google_fonts_lower = {}
+    lower_keys = []
+    google_norm_index = {}
+    api_key = os.getenv("GOOGLE_FONTS_API_KEY")
+    logger.info(f"Google Fonts API key presente: {bool(api_key)}")
+    if api_key:
+        try:
+            fonts = load_google_fonts_catalog(api_key).get("items", [])
+            for f in fonts:
+                family = f["family"]
+                google_fonts[family] = f["files"]
+                low = family.lower()
+                if low not in google_fonts_lower:
+                    lower_keys.append(low)
+                google_fonts_lower[low] = family
+                google_norm_index[_RE_NON_LOWER.sub('', low)] = family
+        except Exception as e:
+            logger.error(f"Erro ao carregar catálogo do Google Fonts: {e}")
+
     # Baixar e preparar Roboto Condensed como fonte fallback
-    roboto_font_paths = download_and_prepare_roboto_condensed_fonts(tmp_dir, logger)
+    roboto_font_paths = download_and_prepare_roboto_condensed_fonts(fonts_dir, logger, google_fonts=google_fonts)
     # Mapear Roboto Condensed como fonte fallback
     for style, path in roboto_font_paths.items():
         if path and os.path.exists(path):
@@ -120,58 +226,70 @@ def main():
     font_registry['default'] = font_registry.get('RobotoCondensed', 'Times-Roman')
     font_registry['default_bold'] = font_registry.get('RobotoCondensed-Bold', 'Times-Bold')
     font_registry['default_italic'] = font_registry.get('RobotoCondensed-Italic', 'Times-Italic')
-    # Carrega catálogo do Google Fonts
-    google_fonts = {}
-    api_key = os.getenv("GOOGLE_FONTS_API_KEY")
-    logger.info(f"Google Fonts API key presente: {bool(api_key)}")
-    if api_key:
-        url = "https://www.googleapis.com/webfonts/v1/webfonts"
-        params = {"key": api_key, "subset": "latin"}
-        try:
-            resp = requests.get(url, params=params, timeout=15)
-            resp.raise_for_status()
-            fonts = resp.json().get("items", [])
-            for f in fonts:
-                google_fonts[f["family"]] = f["files"]
-        except Exception as e:
-            logger.error(f"Erro ao carregar catálogo do Google Fonts: {e}")
-    # Mapear families case-insensitive para matching
-    google_fonts_lower = {family.lower(): family for family in google_fonts.keys()}
     logger.info(f"Famílias do Google Fonts carregadas: {len(google_fonts)}")
     logger.info(f"Famílias do Google Fonts para matching (case-insensitive): {len(google_fonts_lower)}")
+    # Família do Google Fonts resolvida por chave de busca normalizada: PS-names que diferem só pelo
+    # prefixo de subset ou pelo estilo (ABCDEF+OpenSans-Bold, GHIJKL+OpenSans-Italic) fazem o matching uma única vez
+    familias_google = {}
+    def buscar_familia_google(ps_name, family_search):
+        if family_search in familias_google:
+            family = familias_google[family_search]
+            logger.info(f"[font-reg] Chave '{family_search}' já resolvida no Google Fonts: '{family}' para '{ps_name}'")
+            return family
+        family = google_fonts_lower.get(family_search) or google_norm_index.get(_RE_NON_LOWER.sub('', family_search))
+        if family:
+            logger.info(f"[font-reg] Match exato no Google Fonts: '{family}' para '{ps_name}' (normalizado: '{family_search}')")
+        else:
+            similar_lower = melhor_match(family_search, lower_keys, cutoff=0.5)
+            if similar_lower:
+                family = google_fonts_lower[similar_lower]
+                logger.info(f"[font-reg] Fuzzy match no Google Fonts: '{family}' para '{ps_name}' (normalizado: '{family_search}')")
+            else:
+                family = None
+                logger.info(f"[font-reg] Nenhum match no Google Fonts para '{ps_name}' (chave normalizada: '{family_search}')")
+        familias_google[family_search] = family
+        return family
 
     # Registrar fontes originais ou semelhantes para cada fonte do PDF
     # Cache para variantes por família (download único)
     family_variants_cache = {}
+    # Variantes do Google Fonts a baixar: (variant, variant_name, family, url, font_path)
+    pending_downloads = []
+    # Arquivos já presentes no cache de fontes, baixados nesta ou em execuções anteriores (uma listagem,
+    # em vez de um os.path.exists por variante), mais os Roboto Condensed preparados acima
+    arquivos_fonte.update(path for path in roboto_font_paths.values() if path)
     for ps_name, (xref, is_embedded) in font_info_map.items():
         logger.info(f"Processando fonte PS '{ps_name}', embutida={is_embedded}")
         fonte_registrada = False
-        # 1) Tentar extrair e registrar fonte embutida (prioridade máxima)
-        try:
-            info = doc.extract_font(xref)
-            if isinstance(info, dict):
-                font_data = info.get('fontfile') or info.get('file')
-                ext = info.get('ext', 'ttf')  # PyMuPDF pode retornar 'ext' (ttf, otf, etc)
-                if font_data:
-                    font_path = os.path.join(tmp_dir, f"{ps_name}.{ext}")
-                    with open(font_path, 'wb') as f:
-                        f.write(font_data)
-                    font_registry[ps_name] = ps_name  # Usa o mesmo nome do PDF
-                    file_registry[ps_name] = font_path
-                    fonte_registrada = True
-                    logger.info(f"[EXTRAÇÃO] Fonte embutida extraída: '{ps_name}' | xref: {xref} | arquivo: {font_path}")
+        # 1) Tentar extrair e registrar fonte embutida (prioridade máxima); fontes não embutidas,
+        # como as 14 padrão, não têm arquivo a extrair e pulam direto para o matching
+        if is_embedded:
+            try:
+                info = doc.extract_font(xref)
+                if isinstance(info, dict):
+                    font_data = info.get('fontfile') or info.get('file')
+                    ext = info.get('ext', 'ttf')  # PyMuPDF pode retornar 'ext' (ttf, otf, etc)
+                    if font_data:
+                        font_path = os.path.join(tmp_dir, f"{ps_name}.{ext}")
+                        with open(font_path, 'wb') as f:
+                            f.write(font_data)
+                        font_registry[ps_name] = ps_name  # Usa o mesmo nome do PDF
+                        file_registry[ps_name] = font_path
+                        fonte_registrada = True
+                        logger.info(f"[EXTRAÇÃO] Fonte embutida extraída: '{ps_name}' | xref: {xref} | arquivo: {font_path}")
+                    else:
+                        logger.warning(f"[EXTRAÇÃO] Fonte embutida '{ps_name}' encontrada mas sem dados de arquivo extraível.")
                 else:
-                    logger.warning(f"[EXTRAÇÃO] Fonte embutida '{ps_name}' encontrada mas sem dados de arquivo extraível.")
-            else:
-                logger.warning(f"[EXTRAÇÃO] Fonte '{ps_name}' não retornou dict ao tentar extrair.")
-        except Exception as e:
-            logger.warning(f"[EXTRAÇÃO] Falha ao extrair fonte embutida '{ps_name}': {e}. Será tentado fallback.")
+                    logger.warning(f"[EXTRAÇÃO] Fonte '{ps_name}' não retornou dict ao tentar extrair.")
+            except Exception as e:
+                logger.warning(f"[EXTRAÇÃO] Falha ao extrair fonte embutida '{ps_name}': {e}. Será tentado fallback.")
         # 2) Se não registrado, tentar match em fontes locais (exato + fuzzy)
         if not fonte_registrada:
             # 2a) PS suffix PSMT → mapear para Regular local
-            if ps_name.lower().endswith('psmt'):
-                base = re.sub(r'psmt$', '', ps_name, flags=re.IGNORECASE)
-                base_words = re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', base)
+            ps_info = _analyze_ps(ps_name)
+            if ps_info.has_psmt_suffix:
+                base = _RE_PSMT.sub('', ps_name)
+                base_words = _RE_CAMEL.sub(' ', base)
                 key = f"{base_words.strip()}Regular".replace(' ', '')  # Ex: TimesNewRomanRegular
                 if key in local_fonts_map:
                     font_path = local_fonts_map[key]
@@ -180,9 +298,9 @@ def main():
                     fonte_registrada = True
                     logger.info(f"Fonte local PSMT '{key}' mapeada para PS '{ps_name}' via '{font_path}'")
             if not fonte_registrada:
-                normalized_ps = re.sub(r'[^A-Za-z]', '', ps_name)
-                local_keys = list(local_fonts_map.keys())
-                matches = [name for name in local_keys if name.lower() in normalized_ps.lower()]
+                normalized_ps = ps_info.normalized
+                exact = local_norm_index.get(normalized_ps.lower())
+                matches = [exact] if exact else [name for name in local_keys if name.lower() in normalized_ps.lower()]
                 if matches:
                     chosen = max(matches, key=len)
                     font_path = local_fonts_map[chosen]
@@ -191,9 +309,8 @@ def main():
                     fonte_registrada = True
                     logger.info(f"Fonte local exata '{chosen}' mapeada para PS '{ps_name}' via '{font_path}'")
                 else:
-                    similar = difflib.get_close_matches(normalized_ps, local_keys, n=1, cutoff=0.8)
-                    if similar:
-                        chosen = similar[0]
+                    chosen = melhor_match(normalized_ps, local_keys, cutoff=0.8)
+                    if chosen:
                         font_path = local_fonts_map[chosen]
                         file_registry[ps_name] = font_path
                         font_registry[ps_name] = ps_name
@@ -201,26 +318,11 @@ def main():
                         logger.info(f"Fonte local fuzzy '{chosen}' mapeada para PS '{ps_name}' via '{font_path}'")
         # 3) Se não registrado, tentar match exato ou fuzzy no Google Fonts
         if not fonte_registrada and google_fonts_lower:
-            # Normalizar nome: remover prefixo antes do +, remover sufixos de estilo
-            name_part = ps_name.split('+')[-1] if '+' in ps_name else ps_name
-            # Remover sufixos de estilo
-            base_part = re.sub(r'[- ]?(Bold|Italic|Regular|Oblique).*$','', name_part, flags=re.IGNORECASE)
-            # Separar CamelCase e normalizar
-            base_part = re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', base_part)
-            family_search = base_part.replace('-', ' ').strip().lower()
+            # Nome normalizado (sem prefixo de subset e sufixos de estilo), calculado uma vez por PS-name
+            ps_info = _analyze_ps(ps_name)
+            family_search = ps_info.family_search
             logger.info(f"[font-reg] Buscando '{ps_name}' no Google Fonts (chave de busca normalizada: '{family_search}')...")
-            if family_search in google_fonts_lower:
-                family = google_fonts_lower[family_search]
-                logger.info(f"[font-reg] Match exato no Google Fonts: '{family}' para '{ps_name}' (normalizado: '{family_search}')")
-            else:
-                lower_keys = list(google_fonts_lower.keys())
-                similar_lower = difflib.get_close_matches(family_search, lower_keys, n=1, cutoff=0.5)
-                if similar_lower:
-                    family = google_fonts_lower[similar_lower[0]]
-                    logger.info(f"[font-reg] Fuzzy match no Google Fonts: '{family}' para '{ps_name}' (normalizado: '{family_search}')")
-                else:
-                    family = None
-                    logger.info(f"[font-reg] Nenhum match no Google Fonts para '{ps_name}' (chave normalizada: '{family_search}')")
+            family = buscar_familia_google(ps_name, family_search)
             # Se obtivemos family válido, baixa e registra fonte específica para este PS-name
             if family:
                 files = google_fonts.get(family, {})
@@ -239,60 +341,122 @@ def main():
                             continue
                         # Nome único e consistente para cada variante
                         variant_name = padronizar_nome_fonte(fam_key, variant)
-                        font_path = os.path.join(tmp_dir, f"{variant_name}.ttf")
-                        if not os.path.exists(font_path):
-                            try:
-                                logger.info(f"[font-reg] Baixando variante '{variant}' de '{family}' do Google Fonts: {url_ttf}")
-                                resp = requests.get(url_ttf, timeout=15)
-                                resp.raise_for_status()
-                                with open(font_path, 'wb') as f:
-                                    f.write(resp.content)
-                                logger.info(f"[font-reg] Variante '{variant_name}' baixada como '{font_path}'")
-                            except Exception as e:
-                                logger.error(f"[font-reg] Erro ao baixar variante '{variant_name}' de '{family}': {e}")
+                        font_path = os.path.join(fonts_dir, f"{variant_name}.ttf")
+                        if font_path not in arquivos_fonte:
+                            # Download adiado: todas as variantes pendentes são baixadas em paralelo mais adiante
+                            pending_downloads.append((variant, variant_name, family, url_ttf, font_path))
                         file_registry[variant_name] = font_path
                         font_registry[variant_name] = variant_name
-                    # Mapear o ps_name para a variante correta
-                    style_variant = 'regular'
-                    if 'Bold' in name_part and ('Italic' in name_part or 'Oblique' in name_part):
-                        style_variant = 'bolditalic'
-                    elif 'Bold' in name_part:
-                        style_variant = 'bold'
-                    elif 'Italic' in name_part or 'Oblique' in name_part:
-                        style_variant = 'italic'
-                    variant_name = padronizar_nome_fonte(fam_key, style_variant)
-                    if variant_name in file_registry:
-                        registrar_varios_nomes_font_registry(font_registry, ps_name, variant_name)
-                        fonte_registrada = True
-                        logger.info(f"[font-reg] Fonte PS '{ps_name}' mapeada para variante '{variant_name}'")
-                    else:
-                        logger.warning(f"[font-reg] Variante '{variant_name}' não disponível, fallback posterior")
+                # Mapear o ps_name para a variante correta (para todo PS-name da família, não só o primeiro)
+                fam_key = family_variants_cache[family]['key']
+                variant_name = padronizar_nome_fonte(fam_key, ps_info.style)
+                if variant_name in file_registry:
+                    registrar_varios_nomes_font_registry(font_registry, ps_name, variant_name)
+                    fonte_registrada = True
+                    logger.info(f"[font-reg] Fonte PS '{ps_name}' mapeada para variante '{variant_name}'")
+                else:
+                    logger.warning(f"[font-reg] Variante '{variant_name}' não disponível, fallback posterior")
         # 4) fallback para Roboto Condensed ou Times
         if not fonte_registrada:
-            if 'Bold' in ps_name:
+            style = _analyze_ps(ps_name).style
+            if style in ('bold', 'bolditalic'):
                 font_registry[ps_name] = font_registry['default_bold']
-            elif 'Italic' in ps_name or 'Oblique' in ps_name:
+            elif style == 'italic':
                 font_registry[ps_name] = font_registry['default_italic']
             else:
                 font_registry[ps_name] = font_registry['default']
             logger.info(f"Fallback: fonte para PS '{ps_name}' definida como '{font_registry[ps_name]}'")
+    arquivos_fonte.update(baixar_variantes_em_paralelo(pending_downloads, logger))
+    pending_downloads.clear()
 
     # Determinar quais fontes realmente serão usadas neste PDF
     fontes_usadas = set(file_registry.keys())  # Apenas as fontes mapeadas para algum ps_name
 
+    # Cache de objetos Font para medição de texto customizado, compartilhado por todas as páginas e blocos
+    # (fitz.Font analisa as tabelas do TTF, bem mais caro que o text_length)
+    font_cache = {}
+    # Larguras em tamanho 1.0 por (texto, fonte): a largura é linear no tamanho, então cada texto é medido
+    # uma vez mesmo passando pela prova sem quebra, pela quebra de linhas e pela diagramação final.
+    # Limpo a cada página para limitar a memória.
+    width_cache = {}
+    def measure(txt, fontname, fs):
+        key = (txt, fontname)
+        width = width_cache.get(key)
+        if width is None:
+            font = font_cache.get(fontname)
+            if font is None:
+                path = file_registry.get(fontname)
+                try:
+                    if path and os.path.exists(path):
+                        font = fitz.Font(fontfile=path)
+                    else:
+                        font = fitz.Font(fontname)
+                except Exception:
+                    font = fitz.Font()
+                font_cache[fontname] = font
+            width = font.text_length(txt, 1.0)
+            width_cache[key] = width
+        return width * fs
+
+    # Arquivos de fonte lidos e validados uma única vez por documento (caminho -> bytes, ou None se
+    # ausente/inválido); cada página registra a fonte a partir do buffer, sem reabrir o arquivo
+    font_buffers = {}
+    fontes_invalidas = set()
+    def carregar_buffer_fonte(name, path):
+        if path in font_buffers:
+            return font_buffers[path]
+        logger.info("[font-reg][DEBUG] Tentando registrar fonte '%s' com arquivo '%s' (existe: %s)", name, path, bool(path) and os.path.exists(path))
+        buf = None
+        if path and os.path.exists(path):
+            valido, header = is_valid_font_file(path)
+            logger.info("[font-reg][DEBUG] Header do arquivo de fonte '%s': %s", name, header)
+            if valido:
+                with open(path, 'rb') as f:
+                    buf = f.read()
+            else:
+                logger.error("[font-reg][ERRO] Arquivo '%s' não é um TTF/OTF válido! Não será registrado.", path)
+                fontes_invalidas.add(path)
+                # Arquivo inválido no cache de fontes baixadas: remove para ser baixado de novo na próxima execução
+                if os.path.dirname(path) == fonts_dir:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        font_buffers[path] = buf
+        return buf
+
+    def registrar_fonte_na_pagina(page, fontes_pagina, name):
+        # Registro sob demanda: só as fontes efetivamente usadas entram nos recursos da página
+        # (o PyMuPDF reaproveita o mesmo xref de fonte entre as páginas)
+        if name in fontes_pagina:
+            return
+        fontes_pagina.add(name)
+        path = file_registry.get(name)
+        if not path:
+            return
+        buf = carregar_buffer_fonte(name, path)
+        if buf is None:
+            return
+        try:
+            page.insert_font(fontbuffer=buf, fontname=name)
+            logger.info("[font-reg] Fonte '%s' registrada na página usando '%s'", name, path)
+        except Exception as e:
+            logger.error("Erro ao registrar fonte '%s' na página: %s", name, e)
+
     # Percorrer páginas do documento original e gerar no novo
     for page_index, page in enumerate(doc, start=1):
-        logger.info(f"Processando página {page_index}/{len(doc)}")
+        logger.info("Processando página %s/%s", page_index, len(doc))
+        width_cache.clear()
         # criar nova página com mesmas dimensões
         new_page = new_doc.new_page(width=page.rect.width, height=page.rect.height)
         # Importa fundo vetorial limpo da página intermediária
         new_page.show_pdf_page(new_page.rect, clean_doc, page_index-1)
         # Registrar apenas as fontes necessárias nesta página
         # Adicionar fontes detectadas pelo pdfminer (se houver)
-        text_dict = page.get_text('dict')
+        page_dict = page.get_text('dict')
         spans = []
         fontes_pdfminer = set()
-        for block in page.get_text('dict')['blocks']:
+        for block in page_dict['blocks']:
             if block['type'] != 0:
                 continue
             for line in block['lines']:
@@ -300,10 +464,10 @@ def main():
                     txt = span['text']
                     if not txt.strip():
                         continue
-                    logger.info(f"Fonte detectada pelo PyMuPDF: '{span['font']}' para texto '{txt[:30]}...' na página {page.number+1}.")
+                    logger.info("Fonte detectada pelo PyMuPDF: '%s' para texto '%s...' na página %s.", span['font'], txt[:30], page_index)
                     # Se a fonte for Unnamed-*, tenta identificar usando pdfminer
                     if span['font'].startswith('Unnamed-'):
-                        logger.info(f"Fonte 'Unnamed-*' detectada na página {page.number+1}, bbox={span['bbox']}, texto='{txt[:30]}...'. Tentando identificar com pdfminer...")
+                        logger.info("Fonte 'Unnamed-*' detectada na página %s, bbox=%s, texto='%s...'. Tentando identificar com pdfminer...", page_index, span['bbox'], txt[:30])
                         spans_pdfminer = reconstruir_spans_pdfminer(
                             args.input,
                             page.number,
@@ -311,10 +475,10 @@ def main():
                             txt
                         )
                         if spans_pdfminer:
-                            logger.info(f"Spans reconstruídos por pdfminer: {len(spans_pdfminer)} para texto '{txt[:30]}...' na página {page.number+1}.")
+                            logger.info("Spans reconstruídos por pdfminer: %s para texto '%s...' na página %s.", len(spans_pdfminer), txt[:30], page_index)
                             y_original = span['origin'][1]
                             for s in spans_pdfminer:
-                                logger.info(f"Span pdfminer: fonte='{s['font']}', tamanho={s['size']}, texto='{s['text'][:30]}...'")
+                                logger.info("Span pdfminer: fonte='%s', tamanho=%s, texto='%s...'", s['font'], s['size'], s['text'][:30])
                                 spans.append({
                                     'origin': (s['bbox'][0], y_original),
                                     'bbox': s['bbox'],
@@ -326,7 +490,7 @@ def main():
                                 fontes_pdfminer.add(s['font'])
                             continue  # já adicionou os novos spans, não adiciona o Unnamed-*
                         else:
-                            logger.warning(f"Não foi possível identificar a fonte real para texto '{txt[:30]}...' na página {page.number+1} (bbox={span['bbox']}). Mantendo 'Unnamed-*'.")
+                            logger.warning("Não foi possível identificar a fonte real para texto '%s...' na página %s (bbox=%s). Mantendo 'Unnamed-*'.", txt[:30], page.number+1, span['bbox'])
                     else:
                         spans.append({
                             'origin': span['origin'],
@@ -343,35 +507,20 @@ def main():
         # Processar cada fonte do pdfminer pelo mesmo fluxo de registro
         for ps_name in fontes_pdfminer:
             fonte_registrada = False
-            logger.info(f"[font-reg] Processando fonte '{ps_name}' detectada pelo pdfminer...")
+            logger.info("[font-reg] Processando fonte '%s' detectada pelo pdfminer...", ps_name)
             if ps_name in local_fonts_map:
                 file_registry[ps_name] = local_fonts_map[ps_name]
                 registrar_varios_nomes_font_registry(font_registry, ps_name, ps_name)
                 fonte_registrada = True
-                logger.info(f"[font-reg] Fonte local encontrada: '{ps_name}' → '{local_fonts_map[ps_name]}'")
+                logger.info("[font-reg] Fonte local encontrada: '%s' → '%s'", ps_name, local_fonts_map[ps_name])
             else:
-                logger.info(f"[font-reg] Fonte '{ps_name}' NÃO encontrada nas fontes locais.")
+                logger.info("[font-reg] Fonte '%s' NÃO encontrada nas fontes locais.", ps_name)
             if not fonte_registrada and google_fonts_lower:
-                # Normalizar nome: remover prefixo antes do +, remover sufixos de estilo
-                name_part = ps_name.split('+')[-1] if '+' in ps_name else ps_name
-                # Remover sufixos de estilo
-                base_part = re.sub(r'[- ]?(Bold|Italic|Regular|Oblique).*$','', name_part, flags=re.IGNORECASE)
-                # Separar CamelCase e normalizar
-                base_part = re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', base_part)
-                family_search = base_part.replace('-', ' ').strip().lower()
-                logger.info(f"[font-reg] Buscando '{ps_name}' no Google Fonts (chave de busca normalizada: '{family_search}')...")
-                if family_search in google_fonts_lower:
-                    family = google_fonts_lower[family_search]
-                    logger.info(f"[font-reg] Match exato no Google Fonts: '{family}' para '{ps_name}' (normalizado: '{family_search}')")
-                else:
-                    lower_keys = list(google_fonts_lower.keys())
-                    similar_lower = difflib.get_close_matches(family_search, lower_keys, n=1, cutoff=0.5)
-                    if similar_lower:
-                        family = google_fonts_lower[similar_lower[0]]
-                        logger.info(f"[font-reg] Fuzzy match no Google Fonts: '{family}' para '{ps_name}' (normalizado: '{family_search}')")
-                    else:
-                        family = None
-                        logger.info(f"[font-reg] Nenhum match no Google Fonts para '{ps_name}' (chave normalizada: '{family_search}')")
+                # Nome normalizado (sem prefixo de subset e sufixos de estilo), calculado uma vez por PS-name
+                ps_info = _analyze_ps(ps_name)
+                family_search = ps_info.family_search
+                logger.info("[font-reg] Buscando '%s' no Google Fonts (chave de busca normalizada: '%s')...", ps_name, family_search)
+                family = buscar_familia_google(ps_name, family_search)
                 if family:
                     files = google_fonts.get(family, {})
                     fam_key = family.replace(' ', '')
@@ -387,91 +536,102 @@ def main():
                             continue
                         # Nome único e consistente para cada variante
                         variant_name = padronizar_nome_fonte(fam_key, variant)
-                        font_path = os.path.join(tmp_dir, f"{variant_name}.ttf")
-                        if not os.path.exists(font_path):
-                            try:
-                                logger.info(f"[font-reg] Baixando variante '{variant}' de '{family}' do Google Fonts: {url_ttf}")
-                                resp = requests.get(url_ttf, timeout=15)
-                                resp.raise_for_status()
-                                with open(font_path, 'wb') as f:
-                                    f.write(resp.content)
-                                logger.info(f"[font-reg] Variante '{variant_name}' baixada como '{font_path}'")
-                            except Exception as e:
-                                logger.error(f"[font-reg] Erro ao baixar variante '{variant_name}' de '{family}': {e}")
+                        font_path = os.path.join(fonts_dir, f"{variant_name}.ttf")
+                        if font_path not in arquivos_fonte:
+                            # Download adiado: todas as variantes pendentes são baixadas em paralelo mais adiante
+                            pending_downloads.append((variant, variant_name, family, url_ttf, font_path))
                         file_registry[variant_name] = font_path
                         font_registry[variant_name] = variant_name
                     # Mapear o ps_name para a variante correta
-                    style_variant = 'regular'
-                    if 'Bold' in name_part and ('Italic' in name_part or 'Oblique' in name_part):
-                        style_variant = 'bolditalic'
-                    elif 'Bold' in name_part:
-                        style_variant = 'bold'
-                    elif 'Italic' in name_part or 'Oblique' in name_part:
-                        style_variant = 'italic'
-                    variant_name = padronizar_nome_fonte(fam_key, style_variant)
+                    variant_name = padronizar_nome_fonte(fam_key, ps_info.style)
                     if variant_name in file_registry:
                         registrar_varios_nomes_font_registry(font_registry, ps_name, variant_name)
                         fonte_registrada = True
-                        logger.info(f"[font-reg] Fonte PS '{ps_name}' mapeada para variante '{variant_name}'")
+                        logger.info("[font-reg] Fonte PS '%s' mapeada para variante '%s'", ps_name, variant_name)
                     else:
-                        logger.warning(f"[font-reg] Variante '{variant_name}' não disponível, fallback posterior")
+                        logger.warning("[font-reg] Variante '%s' não disponível, fallback posterior", variant_name)
             if not fonte_registrada:
                 # Fallback apenas para a variante específica
-                style_suffix = ''
-                if 'Bold' in ps_name and ('Italic' in ps_name or 'Oblique' in ps_name):
-                    style_suffix = '-BoldItalic'
-                elif 'Bold' in ps_name:
-                    style_suffix = '-Bold'
-                elif 'Italic' in ps_name or 'Oblique' in ps_name:
-                    style_suffix = '-Italic'
+                style_suffix = _analyze_ps(ps_name).style_suffix
                 fallback_name = font_registry.get('RobotoCondensed' + style_suffix) or font_registry.get('default')
                 font_registry[ps_name] = fallback_name
-                logger.info(f"[font-reg] Fallback: fonte para '{ps_name}' definida como '{font_registry[ps_name]}'")
+                logger.info("[font-reg] Fallback: fonte para '%s' definida como '%s'", ps_name, font_registry[ps_name])
+        arquivos_fonte.update(baixar_variantes_em_paralelo(pending_downloads, logger))
+        pending_downloads.clear()
         # Atualizar fontes usadas
         fontes_usadas.update(fontes_pdfminer)
-        # Registrar todas as fontes presentes em file_registry (com arquivo válido)
-        for name, path in file_registry.items():
-            logger.info(f"[font-reg][DEBUG] Tentando registrar fonte '{name}' com arquivo '{path}' (existe: {os.path.exists(path) if path else False})")
-            if path and os.path.exists(path):
-                valido, header = is_valid_font_file(path)
-                logger.info(f"[font-reg][DEBUG] Header do arquivo de fonte '{name}': {header}")
-                if not valido:
-                    logger.error(f"[font-reg][ERRO] Arquivo '{path}' não é um TTF/OTF válido! Não será registrado.")
-                    continue
-                try:
-                    new_page.insert_font(fontfile=path, fontname=name)
-                    logger.info(f"[font-reg] Fonte '{name}' registrada na página usando '{path}'")
-                except Exception as e:
-                    logger.error(f"Erro ao registrar fonte '{name}' na página: {e}")
-        logger.info(f"[font-reg][DEBUG] font_registry: {font_registry}")
-        logger.info(f"[font-reg][DEBUG] file_registry: {file_registry}")
+        # Fontes já registradas nesta página (o registro acontece no primeiro uso, na inserção do texto)
+        fontes_pagina = set()
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("[font-reg][DEBUG] font_registry: %s", font_registry)
+            logger.info("[font-reg][DEBUG] file_registry: %s", file_registry)
         # Inserir spans de texto traduzido
-        logger.info(f"Página {page_index}: inserindo {len(spans)} blocos de texto")
+        logger.info("Página %s: inserindo %s blocos de texto", page_index, len(spans))
         # Agrupar spans em blocos
-        def group_spans(spans, y_threshold=10, x_threshold=10):
+        def group_spans(spans, y_threshold=10, x_threshold=10, cell_height=40):
             """
             Agrupa spans em blocos considerando uma tolerância maior para distância vertical e horizontal,
             evitando separar frases do mesmo bloco mesmo que estejam um pouco distantes.
+            Os blocos ficam indexados numa grade (faixa de tamanho de fonte, faixa vertical), então cada span
+            só é comparado com blocos vizinhos; o resultado é o mesmo da varredura de todos os blocos.
             """
             blocks = []
+            grid = defaultdict(list)  # (faixa de tamanho, faixa vertical) -> índices de blocos
+            cell_ranges = []  # faixas verticais já registradas para cada bloco
+
+            def register(idx):
+                # bbox do bloco só cresce: basta registrar as células novas
+                by0, by1 = blocks[idx]['bbox'][1], blocks[idx]['bbox'][3]
+                lo = int((by0 - y_threshold) // cell_height)
+                hi = int((by1 + y_threshold) // cell_height)
+                size_key = math.floor(blocks[idx]['size'] * 2)
+                old = cell_ranges[idx]
+                for cell in range(lo, hi + 1):
+                    if old is None or not (old[0] <= cell <= old[1]):
+                        grid[(size_key, cell)].append(idx)
+                cell_ranges[idx] = (lo, hi) if old is None else (min(lo, old[0]), max(hi, old[1]))
+
             for span in spans:
                 sx0, sy0, sx1, sy1 = span['bbox']
                 size = span['size']
-                placed = False
-                for block in blocks:
+                # |size - block['size']| <= 0.5 implica faixas (floor(2*size)) vizinhas
+                size_key = math.floor(size * 2)
+                cells = range(int(min(sy0, sy1) // cell_height), int(max(sy0, sy1) // cell_height) + 1)
+                chosen = None
+                for key in (size_key - 1, size_key, size_key + 1):
+                    for cell in cells:
+                        for idx in grid.get((key, cell), ()):
+                            # Mantém a semântica original: o primeiro bloco criado que aceita o span
+                            if chosen is not None and idx >= chosen:
+                                continue
+                            block = blocks[idx]
+                            bx0, by0, bx1, by1 = block['bbox']
+                            # Permite maior tolerância na distância vertical e horizontal
+                            if abs(size - block['size']) <= 0.5 and not (sx1 < bx0 - x_threshold or sx0 > bx1 + x_threshold or sy1 < by0 - y_threshold or sy0 > by1 + y_threshold):
+                                chosen = idx
+                if chosen is not None:
+                    block = blocks[chosen]
                     bx0, by0, bx1, by1 = block['bbox']
-                    # Permite maior tolerância na distância vertical e horizontal
-                    if abs(size - block['size']) <= 0.5 and not (sx1 < bx0 - x_threshold or sx0 > bx1 + x_threshold or sy1 < by0 - y_threshold or sy0 > by1 + y_threshold):
-                        block['spans'].append(span)
-                        block['bbox'] = (min(bx0, sx0), min(by0, sy0), max(bx1, sx1), max(by1, sy1))
-                        placed = True
-                        break
-                if not placed:
+                    block['spans'].append(span)
+                    block['bbox'] = (min(bx0, sx0), min(by0, sy0), max(bx1, sx1), max(by1, sy1))
+                    register(chosen)
+                else:
                     block = {'spans': [span], 'size': size, 'bbox': (sx0, sy0, sx1, sy1)}
                     blocks.append(block)
+                    cell_ranges.append(None)
+                    register(len(blocks) - 1)
             return blocks
 
+        # Memoização por página: os registros de fontes não mudam durante a diagramação dos blocos,
+        # então cada par (base_raw, style) é resolvido uma única vez
+        style_cache = {}
         def get_font_for_style(base_raw, style):
+            key = (base_raw, style)
+            if key not in style_cache:
+                style_cache[key] = resolve_font_for_style(base_raw, style)
+            return style_cache[key]
+
+        def resolve_font_for_style(base_raw, style):
             # base_raw pode ser um ps_name (ex: 'AAAAAA+OpenSans-Regular')
             # Mapeia para o nome único registrado
             base = font_registry.get(base_raw, base_raw)
@@ -479,23 +639,23 @@ def main():
             # Tenta variantes, se não encontrar, busca por família + estilo
             if style == 'normal':
                 if base in font_registry:
-                    logger.info(f"[font-style] Usando fonte normal: {base}")
+                    logger.info("[font-style] Usando fonte normal: %s", base)
                     return font_registry[base]
-                cleaned_raw = re.sub(r'(?i)(?:[- ]?Regular)$', '', base)
+                cleaned_raw = _RE_CLEAN_REGULAR.sub('', base)
                 if cleaned_raw in font_registry:
-                    logger.info(f"[font-style] Usando fonte normal (cleaned): {cleaned_raw}")
+                    logger.info("[font-style] Usando fonte normal (cleaned): %s", cleaned_raw)
                     return font_registry[cleaned_raw]
                 # fallback: tenta regular da família
-                fam_reg = re.sub(r'(Bold|Italic|BoldItalic)$', 'Regular', base)
+                fam_reg = _RE_STYLE_TO_REGULAR.sub('Regular', base)
                 if fam_reg in font_registry:
-                    logger.info(f"[font-style] Usando fonte normal (fam_reg): {fam_reg}")
+                    logger.info("[font-style] Usando fonte normal (fam_reg): %s", fam_reg)
                     return font_registry[fam_reg]
                 # Busca variante local
                 variante = buscar_variante_local(font_registry, file_registry, base, 'normal')
                 if variante:
-                    logger.info(f"[font-style] Usando fonte local normal: {variante}")
+                    logger.info("[font-style] Usando fonte local normal: %s", variante)
                     return variante
-                logger.info(f"[font-style] Usando fallback normal")
+                logger.info("[font-style] Usando fallback normal")
                 return font_registry.get('default')
             elif style == 'bold':
                 if 'Bold' in base:
@@ -503,19 +663,19 @@ def main():
                 else:
                     candidate = base.replace('Regular', '') + 'Bold'
                 if candidate in font_registry:
-                    logger.info(f"[font-style] Usando fonte bold: {candidate}")
+                    logger.info("[font-style] Usando fonte bold: %s", candidate)
                     return font_registry[candidate]
                 # Busca variante local
                 variante = buscar_variante_local(font_registry, file_registry, base, 'bold')
                 if variante:
-                    logger.info(f"[font-style] Usando fonte local bold: {variante}")
+                    logger.info("[font-style] Usando fonte local bold: %s", variante)
                     return variante
                 # fallback: tenta regular da família
-                fam_reg = re.sub(r'(Bold|Italic|BoldItalic)$', 'Regular', base)
+                fam_reg = _RE_STYLE_TO_REGULAR.sub('Regular', base)
                 if fam_reg in font_registry:
-                    logger.info(f"[font-style] Usando fonte bold (fam_reg): {fam_reg}")
+                    logger.info("[font-style] Usando fonte bold (fam_reg): %s", fam_reg)
                     return font_registry[fam_reg]
-                logger.info(f"[font-style] Usando fallback bold")
+                logger.info("[font-style] Usando fallback bold")
                 return font_registry.get('default_bold')
             elif style == 'italic':
                 if 'Italic' in base or 'Oblique' in base:
@@ -523,19 +683,19 @@ def main():
                 else:
                     candidate = base.replace('Regular', '') + 'Italic'
                 if candidate in font_registry:
-                    logger.info(f"[font-style] Usando fonte italic: {candidate}")
+                    logger.info("[font-style] Usando fonte italic: %s", candidate)
                     return font_registry[candidate]
                 # Busca variante local
                 variante = buscar_variante_local(font_registry, file_registry, base, 'italic')
                 if variante:
-                    logger.info(f"[font-style] Usando fonte local italic: {variante}")
+                    logger.info("[font-style] Usando fonte local italic: %s", variante)
                     return variante
                 # fallback: tenta regular da família
-                fam_reg = re.sub(r'(Bold|Italic|BoldItalic)$', 'Regular', base)
+                fam_reg = _RE_STYLE_TO_REGULAR.sub('Regular', base)
                 if fam_reg in font_registry:
-                    logger.info(f"[font-style] Usando fonte italic (fam_reg): {fam_reg}")
+                    logger.info("[font-style] Usando fonte italic (fam_reg): %s", fam_reg)
                     return font_registry[fam_reg]
-                logger.info(f"[font-style] Usando fallback italic")
+                logger.info("[font-style] Usando fallback italic")
                 return font_registry.get('default_italic')
             else:
                 if ('Bold' in base and ('Italic' in base or 'Oblique' in base)):
@@ -543,48 +703,52 @@ def main():
                 else:
                     candidate = base.replace('Regular', '') + 'BoldItalic'
                 if candidate in font_registry:
-                    logger.info(f"[font-style] Usando fonte bolditalic: {candidate}")
+                    logger.info("[font-style] Usando fonte bolditalic: %s", candidate)
                     return font_registry[candidate]
                 # Busca variante local
                 variante = buscar_variante_local(font_registry, file_registry, base, 'bolditalic')
                 if variante:
-                    logger.info(f"[font-style] Usando fonte local bolditalic: {variante}")
+                    logger.info("[font-style] Usando fonte local bolditalic: %s", variante)
                     return variante
                 # fallback: tenta regular da família
-                fam_reg = re.sub(r'(Bold|Italic|BoldItalic)$', 'Regular', base)
+                fam_reg = _RE_STYLE_TO_REGULAR.sub('Regular', base)
                 if fam_reg in font_registry:
-                    logger.info(f"[font-style] Usando fonte bolditalic (fam_reg): {fam_reg}")
+                    logger.info("[font-style] Usando fonte bolditalic (fam_reg): %s", fam_reg)
                     return font_registry[fam_reg]
                 if font_registry.get('default_bold'):
-                    logger.info(f"[font-style] Usando fallback bolditalic (default_bold)")
+                    logger.info("[font-style] Usando fallback bolditalic (default_bold)")
                     return font_registry['default_bold']
-                logger.info(f"[font-style] Usando fallback bolditalic (default_italic)")
+                logger.info("[font-style] Usando fallback bolditalic (default_italic)")
                 return font_registry.get('default_italic')
 
         blocks = group_spans(spans)
+        # 1ª passada: detectar alinhamento e montar o texto marcado de cada bloco
         for block in blocks:
             # Detectar alinhamento original do bloco
             bx0, by0, bx1, by1 = block['bbox']
             # Agrupar spans em linhas com base na coordenada Y
+            # (extremos horizontais de cada linha acumulados já no agrupamento, sem nova passada pelos spans)
             line_clusters = []
             for span in block['spans']:
-                y = span['origin'][1]
-                placed = False
+                x, y = span['origin']
+                sbx0, _, sbx1, _ = span['bbox']
+                x_end = x + (sbx1 - sbx0)
                 for lc in line_clusters:
                     if abs(y - lc['y']) <= 1.0:
                         lc['spans'].append(span)
-                        placed = True
+                        if x < lc['x0']:
+                            lc['x0'] = x
+                        if x_end > lc['x1']:
+                            lc['x1'] = x_end
                         break
-                if not placed:
-                    line_clusters.append({'y': y, 'spans': [span]})
+                else:
+                    line_clusters.append({'y': y, 'spans': [span], 'x0': x, 'x1': x_end})
             # Contar alinhamentos por linha
             counts = {'left': 0, 'right': 0, 'center': 0}
             threshold = 5.0
             for lc in line_clusters:
-                x0_line = min(s['origin'][0] for s in lc['spans'])
-                x1_line = max(s['origin'][0] + (s['bbox'][2] - s['bbox'][0]) for s in lc['spans'])
-                offset_left = x0_line - bx0
-                offset_right = bx1 - x1_line
+                offset_left = lc['x0'] - bx0
+                offset_right = bx1 - lc['x1']
                 if offset_left <= threshold and offset_right > threshold:
                     counts['left'] += 1
                 elif offset_left > threshold and offset_right <= threshold:
@@ -596,41 +760,32 @@ def main():
             block['alignment'] = max(counts, key=lambda k: counts[k])
             # Ordenar spans por posição na página: primeiro Y (topo), depois X (esquerda)
             sorted_spans = sorted(block['spans'], key=lambda s: (s['origin'][1], s['origin'][0]))
-            logger.info(f"[DEBUG][ORIGINAL] Spans agrupados para bloco: {[{'text': s['text'], 'font': s['font'], 'size': s['size']} for s in sorted_spans]}")
-            marked_text = ''
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("[DEBUG][ORIGINAL] Spans agrupados para bloco: %s", [{'text': s['text'], 'font': s['font'], 'size': s['size']} for s in sorted_spans])
+            pieces = []
             for span in sorted_spans:
                 text = span['text'].strip()
-                raw_font = span['font']
                 # marcar XML para estilos: <b><i>, <b>, <i>
-                if 'Bold' in raw_font and ('Italic' in raw_font or 'Oblique' in raw_font):
-                    piece = f'<b><i>{html.escape(text)}</i></b>'
-                elif 'Bold' in raw_font:
-                    piece = f'<b>{html.escape(text)}</b>'
-                elif 'Italic' in raw_font or 'Oblique' in raw_font:
-                    piece = f'<i>{html.escape(text)}</i>'
-                else:
-                    piece = html.escape(text)
-                # garantir espaço entre spans se não houver espaço
-                if marked_text and not marked_text.endswith(' ') and not piece.startswith(' '):
-                    marked_text += ' '
-                marked_text += piece
-            logger.info(f"[DEBUG][ORIGINAL] Texto marcado com tags XML para tradução: {marked_text}")
-            # Traduzir texto preservando tags XML, mas sem ignorar conteúdo de <b> e <i>
-            result = translator.translate_text(
-                marked_text,
-                source_lang='EN',
-                target_lang=args.target_lang,
-                tag_handling='xml',
-                preserve_formatting=True
-            )
-            translated_xml = result.text
-            logger.info(f"[DEBUG] Texto traduzido com tags: {translated_xml}")
+                pieces.append(_TAGS_ESTILO[_estilo_span(span)].format(html.escape(text)))
+            # garantir espaço entre spans (os textos já vêm sem espaços nas bordas)
+            marked_text = ' '.join(pieces)
+            logger.info("[DEBUG][ORIGINAL] Texto marcado com tags XML para tradução: %s", marked_text)
+            block['line_clusters'] = line_clusters
+            block['sorted_spans'] = sorted_spans
+            block['marked_text'] = marked_text
+        # Traduzir todos os blocos da página em lote, preservando tags XML, mas sem ignorar conteúdo de <b> e <i>
+        traducoes = traduzir_em_lotes(translator, [block['marked_text'] for block in blocks], args.target_lang)
+        # 2ª passada: distribuir as traduções e diagramar cada bloco
+        for block, translated_xml in zip(blocks, traducoes):
+            line_clusters = block['line_clusters']
+            sorted_spans = block['sorted_spans']
+            logger.info("[DEBUG] Texto traduzido com tags: %s", translated_xml)
             # Extrair segmentos preservando tags XML <b> e <i> usando ElementTree
             def extrair_segmentos_xml(texto_xml):
                 try:
                     root = ET.fromstring(f'<root>{texto_xml}</root>')
                 except Exception as e:
-                    logger.error(f"[XML] Erro ao parsear XML: {e}\nTexto: {texto_xml}")
+                    logger.error("[XML] Erro ao parsear XML: %s\nTexto: %s", e, texto_xml)
                     return [{'text': texto_xml, 'style': 'normal'}]
                 segmentos = []
                 def walk(node, estilos=None):
@@ -662,45 +817,34 @@ def main():
                 walk(root)
                 return segmentos
             segments = extrair_segmentos_xml(translated_xml)
-            logger.info(f"[DEBUG] Segmentos extraídos: {segments}")
-            for idx, seg in enumerate(segments):
-                logger.info(f"[DEBUG][SEGMENTO] idx={idx} texto='{seg['text']}' estilo={seg['style']}")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("[DEBUG] Segmentos extraídos: %s", segments)
+                for idx, seg in enumerate(segments):
+                    logger.info("[DEBUG][SEGMENTO] idx=%s texto='%s' estilo=%s", idx, seg['text'], seg['style'])
             bx0, by0, bx1, by1 = block['bbox']
             block_width = bx1 - bx0
             block_height = by1 - by0
             # Ajuste de tamanho de fonte por prioridade: manter original, reduzir até 20% ou quebrar linhas
-            # cache de objetos Font para medição de texto customizado
-            font_cache = {}
-            def measure(txt, fontname, fs):
-                if fontname not in font_cache:
-                    path = file_registry.get(fontname)
-                    try:
-                        if path and os.path.exists(path):
-                            font_cache[fontname] = fitz.Font(fontfile=path)
-                        else:
-                            font_cache[fontname] = fitz.Font(fontname)
-                    except Exception:
-                        font_cache[fontname] = fitz.Font()
-                return font_cache[fontname].text_length(txt, fs)
-
             original_size = block['size']
             fontsize = original_size
             line_spacing = 1.2
             # 1) testar sem quebra: medir largura total
             # --- NOVO: Montar texto concatenado com espaçamento correto ---
             def join_segments_with_space(segments):
-                result = ''
+                parts = []
                 for i, seg in enumerate(segments):
                     txt = seg['text']
                     if i > 0:
                         prev = segments[i-1]['text']
                         # Se o anterior não termina com espaço e o atual não começa com espaço, adiciona espaço
                         if not prev.endswith(' ') and not txt.startswith(' '):
-                            result += ' '
-                    result += txt
-                return result
+                            parts.append(' ')
+                    parts.append(txt)
+                return ''.join(parts)
             full_text = join_segments_with_space(segments)
-            full_width = measure(full_text, get_font_for_style(sorted_spans[0]['font'], segments[0]['style']), fontsize)
+            # A largura é linear no tamanho da fonte: mede uma vez em tamanho 1 e escala
+            unit_width = measure(full_text, get_font_for_style(sorted_spans[0]['font'], segments[0]['style']), 1.0)
+            full_width = unit_width * fontsize
             # Calcular número de linhas originais
             original_lines = len(line_clusters)
             def ajustar_titulo_para_linhas(lines, fontsize, block_width, original_lines, min_fontsize=10):
@@ -729,17 +873,11 @@ def main():
                     i += 1
                 lines = [line]
             else:
-                # 2) tentar reduzir fonte até 20%
+                # 2) tentar reduzir fonte até 10%: tamanho exato em que o texto cabe na largura do bloco
                 min_size = original_size * 0.9
-                size_shrink = fontsize
-                while size_shrink > min_size:
-                    size_shrink *= 0.95
-                    full_text = join_segments_with_space(segments)
-                    full_width = measure(full_text, get_font_for_style(sorted_spans[0]['font'], segments[0]['style']), size_shrink)
-                    if full_width <= block_width:
-                        break
-                if full_width <= block_width:
-                    fontsize = size_shrink
+                needed = block_width / unit_width
+                if needed >= min_size:
+                    fontsize = needed
                     base_font = sorted_spans[0]['font']
                     line = []
                     i = 0
@@ -803,29 +941,210 @@ def main():
                 else:
                     x = bx0 + (block_width - line_width) / 2  # fallback para centralizado
                 for seg in line:
-                    logger.info(f"[font-reg][DEBUG] Inserindo texto '{seg['text'][:30]}...' com fonte '{seg['fontname']}' (arquivo: {file_registry.get(seg['fontname'])}) | estilo: {seg.get('style')}")
+                    logger.info("[font-reg][DEBUG] Inserindo texto '%s...' com fonte '%s' (arquivo: %s) | estilo: %s", seg['text'][:30], seg['fontname'], file_registry.get(seg['fontname']), seg.get('style'))
+                    registrar_fonte_na_pagina(new_page, fontes_pagina, seg['fontname'])
                     font_path = file_registry.get(seg['fontname'])
-                    if font_path and os.path.exists(font_path):
-                        valido, header = is_valid_font_file(font_path)
-                        if not valido:
-                            logger.error(f"[font-reg][ERRO] Arquivo '{font_path}' não é um TTF/OTF válido! Não será usado para inserir texto.")
-                            continue
+                    if font_path in fontes_invalidas:
+                        logger.error("[font-reg][ERRO] Arquivo '%s' não é um TTF/OTF válido! Não será usado para inserir texto.", font_path)
+                        continue
                     try:
                         new_page.insert_text((x, y), seg['text'], fontsize=fontsize, fontname=seg['fontname'])
                     except Exception as e:
-                        logger.error(f"Erro ao inserir texto com fonte '{seg['fontname']}': {e}. Usando fallback.")
+                        logger.error("Erro ao inserir texto com fonte '%s': %s. Usando fallback.", seg['fontname'], e)
+                        registrar_fonte_na_pagina(new_page, fontes_pagina, font_registry.get('default'))
                         new_page.insert_text((x, y), seg['text'], fontsize=fontsize, fontname=font_registry.get('default'))
                     x += measure(seg['text'], seg['fontname'], fontsize)
                 y += fontsize * line_spacing
-        logger.info(f"Página {page_index} processada com sucesso: {len(blocks)} blocos de texto traduzido")
-    # salva o PDF traduzido apenas com conteúdo reescrito
-    new_doc.save(args.output)
+        logger.info("Página %s processada com sucesso: %s blocos de texto traduzido", page_index, len(blocks))
+    # Reduz as fontes embutidas aos glifos realmente usados no texto traduzido
+    try:
+        new_doc.subset_fonts()
+    except Exception as e:
+        logger.warning("Não foi possível criar subconjuntos das fontes embutidas: %s", e)
+    # salva o PDF traduzido apenas com conteúdo reescrito; garbage=3 elimina objetos duplicados
+    # (recursos copiados por show_pdf_page em cada página), deflate comprime os streams e clean
+    # compacta os streams de conteúdo gerados pelas inserções de texto
+    new_doc.save(args.output, garbage=3, deflate=True, clean=True)
+    if len(_TRADUCOES_CACHE) > traducoes_iniciais:
+        salvar_cache_traducoes(TRADUCOES_CACHE_PATH)
     new_doc.close()
     doc.close()
     clean_doc.close()
+    _HTTP_SESSION.close()
     shutil.rmtree(tmp_dir)
 
-def download_and_prepare_roboto_condensed_fonts(tmp_dir, logger=None):
+def _arquivo_parcial(path):
+    """
+    Cria um arquivo temporário exclusivo ao lado de `path` (ex.: 'fonte.ttf.a1b2c3.part') e retorna (fd, caminho).
+    O cache é compartilhado por execuções concorrentes, então cada processo grava no seu próprio arquivo
+    antes do os.replace.
+    """
+    return tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.part')
+
+def _download_font(url, local_path):
+    """
+    Baixa um arquivo de fonte de forma atômica: grava num '.part' exclusivo e renomeia com os.replace.
+    Uma resposta que não é TTF/OTF (ex.: página HTML de proxy ou captive portal) é descartada e gera erro,
+    para não ficar no cache persistente impedindo novos downloads.
+    """
+    fd, tmp_path = _arquivo_parcial(local_path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            with _HTTP_SESSION.get(url, timeout=15, stream=True) as r:
+                r.raise_for_status()
+                r.raw.decode_content = True
+                shutil.copyfileobj(r.raw, f, length=64 * 1024)
+        valido, header = is_valid_font_file(tmp_path)
+        if not valido:
+            raise ValueError(f"conteúdo baixado de '{url}' não é um TTF/OTF válido (header: {header})")
+        os.replace(tmp_path, local_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def baixar_variantes_em_paralelo(downloads, logger, max_workers=8):
+    """
+    Baixa variantes do Google Fonts concorrentemente (I/O de rede libera o GIL).
+    Cada item é (variant, variant_name, family, url, font_path); caminhos repetidos são baixados uma vez.
+    Retorna o conjunto de caminhos baixados com sucesso.
+    """
+    pendentes = {item[4]: item for item in downloads}
+    if not pendentes:
+        return set()
+
+    def baixar(item):
+        variant, variant_name, family, url_ttf, font_path = item
+        try:
+            logger.info(f"[font-reg] Baixando variante '{variant}' de '{family}' do Google Fonts: {url_ttf}")
+            _download_font(url_ttf, font_path)
+            logger.info(f"[font-reg] Variante '{variant_name}' baixada como '{font_path}'")
+            return font_path
+        except Exception as e:
+            logger.error(f"[font-reg] Erro ao baixar variante '{variant_name}' de '{family}': {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pendentes))) as executor:
+        return {path for path in executor.map(baixar, pendentes.values()) if path}
+
+def load_google_fonts_catalog(api_key, cache_dir=CACHE_DIR, ttl=86400):
+    """Retorna o catálogo JSON do Google Fonts, reutilizando a cópia em disco enquanto tiver menos de `ttl` segundos."""
+    cache_path = os.path.join(cache_dir, 'google_fonts.json')
+    try:
+        if time.time() - os.stat(cache_path).st_mtime < ttl:
+            with open(cache_path, 'rb') as f:
+                return _json_loads(f.read())
+    except (OSError, ValueError):
+        pass
+    api_url = "https://www.googleapis.com/webfonts/v1/webfonts"
+    params = {"key": api_key, "subset": "latin"}
+    resp = _HTTP_SESSION.get(api_url, params=params, timeout=15)
+    resp.raise_for_status()
+    data = resp.content
+    manifest = _json_loads(data)
+    # Escrita atômica: um cache truncado nunca é lido na próxima execução. Falhar ao gravar o cache
+    # (diretório somente leitura, disco cheio) não descarta o catálogo já baixado.
+    tmp_path = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = _arquivo_parcial(cache_path)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logging.getLogger('translate_pdf').warning(f"Não foi possível gravar o cache do catálogo em '{cache_path}': {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return manifest
+
+def precisa_traduzir(texto_marcado):
+    """
+    Indica se o texto (sem tags XML e entidades) contém alguma palavra com duas ou mais letras; números,
+    pontuação, marcadores como '(a)' e letras soltas não vão ao DeepL.
+    """
+    return bool(_RE_PALAVRA.search(html.unescape(_RE_XML_TAG.sub('', texto_marcado))))
+
+def traduzir_em_lotes(translator, textos, target_lang):
+    """
+    Traduz uma lista de textos marcados com XML usando o menor número possível de requisições ao DeepL.
+    Textos sem letras são devolvidos como estão e textos já traduzidos (nesta ou em execuções anteriores) vêm da
+    memória de tradução; só os textos únicos restantes são enviados, em lotes de até BATCH_SIZE itens / BATCH_MAX_BYTES
+    bytes. O resultado mantém a mesma ordem da entrada.
+    """
+    chaves = {texto: _chave_traducao(texto, target_lang) for texto in textos}
+    pendentes = [texto for texto, chave in chaves.items() if chave not in _TRADUCOES_CACHE and precisa_traduzir(texto)]
+    _TRADUCOES_USADAS.update(chaves.values())
+    lote = []
+    lote_bytes = 0
+
+    def enviar():
+        if not lote:
+            return
+        results = translator.translate_text(
+            lote,
+            source_lang='EN',
+            target_lang=target_lang,
+            tag_handling='xml',
+            preserve_formatting=True
+        )
+        for texto, r in zip(lote, results):
+            _TRADUCOES_CACHE[chaves[texto]] = r.text
+        lote.clear()
+
+    for texto in pendentes:
+        tamanho = len(texto.encode('utf-8'))
+        if lote and (len(lote) >= BATCH_SIZE or lote_bytes + tamanho > BATCH_MAX_BYTES):
+            enviar()
+            lote_bytes = 0
+        lote.append(texto)
+        lote_bytes += tamanho
+    enviar()
+    return [_TRADUCOES_CACHE.get(chaves[texto], texto) for texto in textos]
+
+def _chave_traducao(texto, target_lang):
+    return hashlib.sha1(f"EN\0{target_lang}\0{texto}".encode('utf-8')).hexdigest()
+
+def _ler_cache_traducoes(path):
+    try:
+        with open(path, 'rb') as f:
+            dados = _json_loads(f.read())
+        return dados if isinstance(dados, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def carregar_cache_traducoes(path):
+    """Carrega a memória de tradução persistida; um arquivo ausente ou corrompido apenas começa vazio."""
+    _TRADUCOES_CACHE.update(_ler_cache_traducoes(path))
+
+def salvar_cache_traducoes(path, max_entradas=TRADUCOES_CACHE_MAX):
+    """
+    Grava a memória de tradução de forma atômica (nunca deixa um JSON truncado para a próxima execução).
+    O arquivo é relido antes da gravação para não perder entradas salvas por execuções concorrentes; as
+    entradas usadas nesta execução vão para o fim e só as `max_entradas` mais recentes são mantidas.
+    """
+    mescladas = _ler_cache_traducoes(path)
+    for chave, traducao in _TRADUCOES_CACHE.items():
+        if chave not in mescladas and chave not in _TRADUCOES_USADAS:
+            mescladas[chave] = traducao
+    for chave in _TRADUCOES_USADAS:
+        if chave in _TRADUCOES_CACHE:
+            mescladas.pop(chave, None)
+            mescladas[chave] = _TRADUCOES_CACHE[chave]
+    if len(mescladas) > max_entradas:
+        mescladas = dict(list(mescladas.items())[-max_entradas:])
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = _arquivo_parcial(path)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(mescladas, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.getLogger('translate_pdf').warning(f"Não foi possível salvar a memória de tradução em '{path}': {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def download_and_prepare_roboto_condensed_fonts(fonts_dir, logger=None, google_fonts=None):
     logger = logger or logging.getLogger('translate_pdf')
     # URLs estáticas para Roboto Condensed no GitHub
     static_urls = {
@@ -835,117 +1154,141 @@ def download_and_prepare_roboto_condensed_fonts(tmp_dir, logger=None):
     }
     # Preparar lista de URLs a baixar (inicialmente estáticas)
     urls_to_download = static_urls.copy()
-    API_KEY = os.getenv("GOOGLE_FONTS_API_KEY")
-    if API_KEY:
-        try:
-            # Tentar obter via API para usar possíveis variantes mais recentes
-            api_url = "https://www.googleapis.com/webfonts/v1/webfonts"
-            params = {"key": API_KEY, "subset": "latin"}
-            resp = requests.get(api_url, params=params, timeout=15)
-            resp.raise_for_status()
-            fonts = resp.json().get("items", [])
-            rc = next((f for f in fonts if f["family"] == "Roboto Condensed"), None)
-            if rc and "files" in rc:
-                files = rc["files"]
-                urls_to_download = {
-                    'RobotoCondensed': files.get('regular'),
-                    'RobotoCondensed-Bold': files.get('700') or files.get('bold'),
-                    'RobotoCondensed-Italic': files.get('italic'),
-                }
-                logger.info("Usando API do Google Fonts para Roboto Condensed")
-            else:
-                logger.warning("Roboto Condensed não encontrado via API, usando URLs estáticas")
-        except Exception as e:
-            logger.error(f"Erro ao obter Roboto Condensed via API: {e}, usando URLs estáticas")
-    # Download e preparação dos arquivos de fonte
+    if google_fonts:
+        # Usar o catálogo já carregado (família -> arquivos) para possíveis variantes mais recentes
+        files = google_fonts.get("Roboto Condensed")
+        if files:
+            urls_to_download = {
+                'RobotoCondensed': files.get('regular'),
+                'RobotoCondensed-Bold': files.get('700') or files.get('bold'),
+                'RobotoCondensed-Italic': files.get('italic'),
+            }
+            logger.info("Usando API do Google Fonts para Roboto Condensed")
+        else:
+            logger.warning("Roboto Condensed não encontrado via API, usando URLs estáticas")
+    # Download e preparação dos arquivos de fonte; os estilos ausentes são baixados em paralelo
     font_paths = {}
+    pendentes = {}
+    try:
+        existentes = set(os.listdir(fonts_dir))
+    except OSError:
+        existentes = set()
     for style, url_ttf in urls_to_download.items():
         if not url_ttf:
             font_paths[style] = None
             continue
-        local_path = os.path.join(tmp_dir, f"{style}.ttf")
+        local_path = os.path.join(fonts_dir, f"{style}.ttf")
+        font_paths[style] = local_path
+        if f"{style}.ttf" not in existentes:
+            pendentes[style] = (url_ttf, local_path)
+
+    def baixar(style):
         try:
-            if not os.path.exists(local_path):
-                r = requests.get(url_ttf, timeout=15)
-                r.raise_for_status()
-                with open(local_path, 'wb') as f:
-                    f.write(r.content)
-            font_paths[style] = local_path
-            logger.info(f"Roboto Condensed estilo '{style}' disponível em '{local_path}'")
+            _download_font(*pendentes[style])
+            return True
         except Exception as e:
             logger.error(f"Falha ao baixar Roboto Condensed {style}: {e}")
-            font_paths[style] = None
+            return False
+
+    if pendentes:
+        with ThreadPoolExecutor(max_workers=len(pendentes)) as executor:
+            for style, ok in zip(pendentes, executor.map(baixar, pendentes)):
+                if not ok:
+                    font_paths[style] = None
+    for style, local_path in font_paths.items():
+        if local_path:
+            logger.info(f"Roboto Condensed estilo '{style}' disponível em '{local_path}'")
     return font_paths
 
 def strip_text_from_pdf(input_path: str, output_path: str):
-    """Remove operadores de texto (BT...ET) de todas as páginas e Form XObjects (recursivo), mantendo gráficos e imagens."""
+    """Remove operadores de texto (BT...ET) de todas as páginas e Form XObjects (aninhados), mantendo gráficos e imagens."""
     pdf = pikepdf.open(input_path)
 
-    def remove_text_from_stream(obj, pdf, processed=None):
-        if processed is None:
-            processed = set()
-        # Evita loops infinitos em XObjects recursivos
-        obj_id = id(obj)
-        if obj_id in processed:
-            return obj.get("/Contents", None)
-        processed.add(obj_id)
+    def remove_text_from_stream(obj):
+        # Uma única passada sobre os operadores já tokenizados pelo qpdf: copia tudo que está fora
+        # de BT...ET, em vez de apagar fatias da lista (cada 'del' era O(n))
         cs = pikepdf.parse_content_stream(obj)
-        remove_ranges = []
-        stack = []
-        for idx, (operands, op) in enumerate(cs):
-            if op == pikepdf.Operator("BT"):
-                stack.append(idx)
-            elif op == pikepdf.Operator("ET") and stack:
-                start = stack.pop()
-                remove_ranges.append((start, idx + 1))
-        for start, end in reversed(remove_ranges):
-            del cs[start:end]
-        # Processa recursivamente XObjects do tipo Form
+        kept = []
+        depth = 0
+        open_idx = 0
+        for idx, instr in enumerate(cs):
+            operands, op = instr
+            if op == _OP_BT:
+                if depth == 0:
+                    open_idx = idx
+                depth += 1
+            elif depth:
+                if op == _OP_ET:
+                    depth -= 1
+            else:
+                kept.append(instr)
+        if depth:
+            # BT sem ET correspondente: mantém o trecho intacto, como antes
+            kept.extend(cs[open_idx:])
+        return pikepdf.unparse_content_stream(kept)
+
+    def content_bytes(obj, is_page):
+        if not is_page:
+            return obj.read_bytes()
+        contents = obj.obj.get("/Contents")
+        if contents is None:
+            return b''
+        if isinstance(contents, pikepdf.Array):
+            return b''.join(c.read_bytes() for c in contents)
+        return contents.read_bytes()
+
+    # Fila de trabalho explícita (sem recursão): páginas e depois os Form XObjects encontrados.
+    # 'seen' usa o objgen, então XObjects compartilhados ou cíclicos são reescritos uma única vez.
+    work = deque((page, True) for page in pdf.pages)
+    seen = set()
+    while work:
+        obj, is_page = work.popleft()
+        objgen = obj.obj.objgen if is_page else obj.objgen
+        if objgen in seen:
+            continue
+        seen.add(objgen)
+        try:
+            # Teste barato antes do parse: sem 'BT' nos bytes não há objeto de texto a remover
+            # (páginas escaneadas/raster), mas os XObjects ainda são percorridos abaixo
+            if b'BT' in content_bytes(obj, is_page):
+                new_bytes = remove_text_from_stream(obj)
+                if is_page:
+                    obj.Contents = pdf.make_stream(new_bytes)
+                else:
+                    # Em um Form XObject o próprio stream é o conteúdo
+                    obj.write(new_bytes)
+        except Exception:
+            if is_page:
+                raise
+            continue
         resources = obj.get("/Resources", {})
         xobjects = resources.get("/XObject", {})
         for name, xobj in xobjects.items():
             try:
                 subtype = xobj.get("/Subtype", None)
-                if subtype and str(subtype) == "/Form":
-                    xobj["/Contents"] = remove_text_from_stream(xobj, pdf, processed)
+                if subtype and str(subtype) == "/Form" and xobj.objgen not in seen:
+                    work.append((xobj, False))
             except Exception:
                 continue
-        return pdf.make_stream(pikepdf.unparse_content_stream(cs))
-
-    for page in pdf.pages:
-        # Remove texto da página e de todos os XObjects recursivamente
-        page.Contents = remove_text_from_stream(page, pdf)
     pdf.save(output_path)
 
-# Função para reconstruir spans detalhados usando pdfminer
-def reconstruir_spans_pdfminer(pdf_path: str, page_number: int, bbox: tuple, texto: str):
+@functools.lru_cache(maxsize=4)
+def _chars_pdfminer_pagina(pdf_path: str, page_number: int):
     """
-    Retorna uma lista de spans (dicts) para o trecho de texto, agrupando por fonte/estilo, como o PyMuPDF faz.
-    Cada span: {'text', 'bbox', 'font', 'size', 'flags'}
+    Executa a análise de layout do pdfminer apenas na página pedida e devolve seus caracteres como
+    (texto, fonte, tamanho, bbox no sistema do PyMuPDF). O resultado fica em cache, pois a mesma página
+    é consultada uma vez para cada span 'Unnamed-*'. Retorna None se o pdfminer não estiver instalado.
     """
     try:
         from pdfminer.high_level import extract_pages
         from pdfminer.layout import LTTextContainer, LTChar
     except ImportError:
-        return []
-    import fitz
+        return None
     doc = fitz.open(pdf_path)
     page_height = doc[page_number].rect.height
     doc.close()
-    spans = []
     chars = []
-    bx0, by0, bx1, by1 = bbox
-    texto_alvo = texto.replace('\n', '').replace('\r', '').strip()
-    import logging
-    logger = logging.getLogger('translate_pdf')
-    logger.info(f"[pdfminer] Iniciando busca de spans para texto '{texto[:30]}...' na página {page_number+1}, bbox={bbox}")
-    def bboxes_overlap(b1, b2, tol=1.0):
-        x0_1, y0_1, x1_1, y1_1 = b1
-        x0_2, y0_2, x1_2, y1_2 = b2
-        return not (x1_1 < x0_2 - tol or x1_2 < x0_1 - tol or y1_1 < y0_2 - tol or y1_2 < y0_1 - tol)
-    for i, page_layout in enumerate(extract_pages(pdf_path)):
-        if i != page_number:
-            continue
+    for page_layout in extract_pages(pdf_path, page_numbers=[page_number]):
         for element in page_layout:
             if isinstance(element, LTTextContainer):
                 for text_line in element:
@@ -955,19 +1298,42 @@ def reconstruir_spans_pdfminer(pdf_path: str, page_number: int, bbox: tuple, tex
                             # Converter para sistema do PyMuPDF
                             new_y0 = page_height - y1
                             new_y1 = page_height - y0
-                            bbox_pymupdf = (x0, new_y0, x1, new_y1)
-                            overlap = bboxes_overlap(bbox_pymupdf, bbox, tol=2.0)
-                            if overlap:
-                                chars.append({
-                                    'char': char.get_text(),
-                                    'font': char.fontname,
-                                    'size': char.size,
-                                    'bbox': bbox_pymupdf,
-                                    'flags': 0
-                                })
+                            chars.append((char.get_text(), char.fontname, char.size, (x0, new_y0, x1, new_y1)))
+    return chars
+
+# Função para reconstruir spans detalhados usando pdfminer
+def reconstruir_spans_pdfminer(pdf_path: str, page_number: int, bbox: tuple, texto: str):
+    """
+    Retorna uma lista de spans (dicts) para o trecho de texto, agrupando por fonte/estilo, como o PyMuPDF faz.
+    Cada span: {'text', 'bbox', 'font', 'size', 'flags'}
+    """
+    page_chars = _chars_pdfminer_pagina(pdf_path, page_number)
+    if page_chars is None:
+        return []
+    spans = []
+    chars = []
+    bx0, by0, bx1, by1 = bbox
+    texto_alvo = texto.replace('\n', '').replace('\r', '').strip()
+    import logging
+    logger = logging.getLogger('translate_pdf')
+    logger.info("[pdfminer] Iniciando busca de spans para texto '%s...' na página %s, bbox=%s", texto[:30], page_number+1, bbox)
+    def bboxes_overlap(b1, b2, tol=1.0):
+        x0_1, y0_1, x1_1, y1_1 = b1
+        x0_2, y0_2, x1_2, y1_2 = b2
+        return not (x1_1 < x0_2 - tol or x1_2 < x0_1 - tol or y1_1 < y0_2 - tol or y1_2 < y0_1 - tol)
+    for char_text, fontname, size, bbox_pymupdf in page_chars:
+        overlap = bboxes_overlap(bbox_pymupdf, bbox, tol=2.0)
+        if overlap:
+            chars.append({
+                'char': char_text,
+                'font': fontname,
+                'size': size,
+                'bbox': bbox_pymupdf,
+                'flags': 0
+            })
     # Agrupar chars consecutivos com mesma fonte e tamanho
     if not chars:
-        logger.warning(f"[pdfminer] Nenhum caractere encontrado para o texto alvo '{texto[:30]}...' na página {page_number+1}.")
+        logger.warning("[pdfminer] Nenhum caractere encontrado para o texto alvo '%s...' na página %s.", texto[:30], page_number+1)
         return []
     grupo = {'text': '', 'font': chars[0]['font'], 'size': chars[0]['size'], 'flags': chars[0]['flags'], 'bbox': list(chars[0]['bbox'])}
     for idx, c in enumerate(chars):
@@ -979,7 +1345,7 @@ def reconstruir_spans_pdfminer(pdf_path: str, page_number: int, bbox: tuple, tex
             grupo['bbox'][2] = max(grupo['bbox'][2], c['bbox'][2])
             grupo['bbox'][3] = max(grupo['bbox'][3], c['bbox'][3])
         else:
-            logger.info(f"[pdfminer] Novo grupo de span: fonte='{grupo['font']}', tamanho={grupo['size']}, texto='{grupo['text'][:30]}...'")
+            logger.info("[pdfminer] Novo grupo de span: fonte='%s', tamanho=%s, texto='%s...'", grupo['font'], grupo['size'], grupo['text'][:30])
             spans.append({
                 'text': grupo['text'],
                 'font': grupo['font'],
@@ -990,7 +1356,7 @@ def reconstruir_spans_pdfminer(pdf_path: str, page_number: int, bbox: tuple, tex
             grupo = {'text': c['char'], 'font': c['font'], 'size': c['size'], 'flags': c['flags'], 'bbox': list(c['bbox'])}
     # Adiciona o último grupo
     if grupo['text']:
-        logger.info(f"[pdfminer] Último grupo de span: fonte='{grupo['font']}', tamanho={grupo['size']}, texto='{grupo['text'][:30]}...'")
+        logger.info("[pdfminer] Último grupo de span: fonte='%s', tamanho=%s, texto='%s...'", grupo['font'], grupo['size'], grupo['text'][:30])
         spans.append({
             'text': grupo['text'],
             'font': grupo['font'],
@@ -1000,7 +1366,7 @@ def reconstruir_spans_pdfminer(pdf_path: str, page_number: int, bbox: tuple, tex
         })
     # Filtra spans vazios e ajusta texto
     spans = [s for s in spans if s['text'].strip()]
-    logger.info(f"[pdfminer] Total de spans agrupados: {len(spans)} para texto '{texto[:30]}...' na página {page_number+1}.")
+    logger.info("[pdfminer] Total de spans agrupados: %s para texto '%s...' na página %s.", len(spans), texto[:30], page_number+1)
     return spans
 
 # Função para padronizar nome de fonte para o PyMuPDF
@@ -1014,6 +1380,61 @@ def padronizar_nome_fonte(fam_key, variant):
     else:
         return f"{fam_key}Regular"
 
+_TAGS_ESTILO = {'regular': '{}', 'bold': '<b>{}</b>', 'italic': '<i>{}</i>', 'bolditalic': '<b><i>{}</i></b>'}
+
+@functools.lru_cache(maxsize=None)
+def _estilo_fonte(font_name):
+    """Classifica o nome da fonte como 'regular', 'bold', 'italic' ou 'bolditalic'."""
+    palavras = set(_RE_STYLE_WORD.findall(font_name))
+    bold = 'Bold' in palavras
+    italic = 'Italic' in palavras or 'Oblique' in palavras
+    return ('bold' if bold else '') + ('italic' if italic else '') or 'regular'
+
+# Bits de estilo em span['flags'] do PyMuPDF (TEXT_FONT_ITALIC e TEXT_FONT_BOLD)
+_FLAG_ITALIC = 2
+_FLAG_BOLD = 16
+
+def _estilo_span(span):
+    """Estilo do span pelo nome da fonte; se o nome não indicar estilo (ex.: 'F1'), usa os flags do PyMuPDF."""
+    estilo = _estilo_fonte(span['font'])
+    if estilo != 'regular':
+        return estilo
+    flags = span.get('flags', 0)
+    return ('bold' if flags & _FLAG_BOLD else '') + ('italic' if flags & _FLAG_ITALIC else '') or 'regular'
+
+_STYLE_SUFFIXES = {'regular': '', 'bold': '-Bold', 'italic': '-Italic', 'bolditalic': '-BoldItalic'}
+
+class PSInfo(NamedTuple):
+    normalized: str       # só letras, ex.: 'ABCDEFTimesNewRomanPSBoldMT'
+    family_search: str    # chave de busca no Google Fonts, ex.: 'times new roman ps'
+    style: str            # 'regular', 'bold', 'italic' ou 'bolditalic'
+    style_suffix: str     # sufixo de fallback, ex.: '-BoldItalic'
+    has_psmt_suffix: bool
+
+@functools.lru_cache(maxsize=None)
+def _analyze_ps(ps_name):
+    """Normaliza um PS-name uma única vez (nome, chave de busca e estilo), reaproveitado por todos os passos de registro."""
+    name_part = ps_name.split('+')[-1]
+    base_part = _RE_CAMEL.sub(' ', _RE_STYLE_SUFFIX.sub('', name_part))
+    style = _estilo_fonte(name_part)
+    return PSInfo(
+        normalized=_RE_NON_ALPHA.sub('', ps_name),
+        family_search=base_part.replace('-', ' ').strip().lower(),
+        style=style,
+        style_suffix=_STYLE_SUFFIXES[style],
+        has_psmt_suffix=ps_name.lower().endswith('psmt'),
+    )
+
+def melhor_match(query, choices, cutoff):
+    """Retorna o item de `choices` mais parecido com `query` (similaridade >= cutoff, entre 0 e 1) ou None."""
+    if rf_process is not None:
+        # processor=None explícito: rapidfuzz < 3.0 normalizava (minúsculas, sem pontuação) por padrão, e o
+        # matching das fontes locais compara chaves sensíveis a maiúsculas, como o difflib
+        match = rf_process.extractOne(query, choices, scorer=rf_fuzz.ratio, processor=None, score_cutoff=cutoff * 100)
+        return match[0] if match else None
+    similar = difflib.get_close_matches(query, choices, n=1, cutoff=cutoff)
+    return similar[0] if similar else None
+
 def is_valid_font_file(path):
     """Verifica se o arquivo é um TTF/OTF válido pelo header."""
     try:
@@ -1028,18 +1449,19 @@ def is_valid_font_file(path):
         return False, str(e)
 
 def registrar_varios_nomes_font_registry(font_registry, ps_name, variant_name):
-    # Adiciona várias variações do nome ao font_registry
+    # Adiciona várias variações do nome ao font_registry. Só o próprio ps_name é sobrescrito: os apelidos
+    # não substituem um mapeamento existente (ex.: 'Helvetica-Oblique' não pode redirecionar 'Helvetica')
     font_registry[ps_name] = variant_name
     # Nome sem prefixo
     if '+' in ps_name:
         sem_prefixo = ps_name.split('+', 1)[-1]
-        font_registry[sem_prefixo] = variant_name
+        font_registry.setdefault(sem_prefixo, variant_name)
     # Nome sem hífen
     sem_hifen = ps_name.replace('-', '')
-    font_registry[sem_hifen] = variant_name
+    font_registry.setdefault(sem_hifen, variant_name)
     # Nome base (ex: Roboto, BreeSerif)
-    base = re.sub(r'[- ]?(Regular|Bold|Italic|Oblique|BoldItalic)$', '', ps_name, flags=re.IGNORECASE)
-    font_registry[base] = variant_name
+    base = _RE_BASE_NAME.sub('', ps_name)
+    font_registry.setdefault(base, variant_name)
 
 # Função auxiliar para buscar variante de fonte local por família e estilo
 def buscar_variante_local(font_registry, file_registry, base, estilo):
@@ -1050,8 +1472,8 @@ def buscar_variante_local(font_registry, file_registry, base, estilo):
         'bolditalic': ['BoldItalic', 'bolditalic', 'BoldOblique', 'boldoblique'],
         'normal': ['Regular', 'regular', 'MT', 'PSMT', ''],
     }
-    familia = re.sub(r'PSMT$', '', base, flags=re.IGNORECASE)
-    familia = re.sub(r'PS-BoldMT$', '', familia, flags=re.IGNORECASE)
+    familia = _RE_PSMT.sub('', base)
+    familia = _RE_PS_BOLDMT.sub('', familia)
     familia = familia.replace('+', '').replace('-', '').replace(' ', '')
     for suf in sufixos.get(estilo, []):
         for nome in file_registry.keys():